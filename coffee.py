@@ -15,15 +15,20 @@ import  os, sys, atexit, \
         numpy as np
 #/~ Modules
 
-#~ Setup
-# Make sure the working directory is set to this script's location.
-os.chdir(os.path.dirname(sys.argv[0]))
-# Make sure any open plots are closed when this script ends.
-atexit.register(lambda destruct: plt.close(), None)
-#/~ Setup
+#~ Globals
+# The default resolution and zero of Temperatures stored as 'int16'; 0.01°C from -327.67°C to 327.67°C.
+SCALE, OFFSET = .01, 0.
+# The 'int16' that stores 'nan'.
+EMPTY = -32768
+# The precisions in which trajectories may be stored.
+PRECISIONS = ('float64', 'float32', 'int16')
+# The quantities 'cool' can be asked to seek.
+GOALS = ('best', 'threshold', 'epsilon', 'at')
+#/~ Globals
 
 #~ Functions
-def model(t0=0, tf=30, dt=.1, T0=90, Tf=70, Tp=75, Te=-5, experiments=8):
+def model(t0=0, tf=30, dt=.1, T0=90, Tf=70, Tp=75, Te=-5, experiments=8, goals=None, precision='float64',
+          deviation=None, scale=SCALE, offset=OFFSET):
     """ Models the rate of cooling of coffee over time.
 
         :param t0: The inital time of Temperature measurement.
@@ -34,11 +39,16 @@ def model(t0=0, tf=30, dt=.1, T0=90, Tf=70, Tp=75, Te=-5, experiments=8):
         :param Tp: The preferred temperature of the object.
         :param Te: The immediate change in temperature upon experiment.
         :param experiments: The number of intervals to conduct an experiment; add cream.
+        :param goals: An optional dictionary of the quantities needed; see 'cool'.
+        :param precision: The precision in which to store the trajectories; see 'cool'.
+        :param deviation: An optional dictionary to fill with the worst deviation from full precision; see 'cool'.
+        :param scale: The resolution of Temperatures stored as 'int16'.
+        :param offset: The Temperature stored as 0 in 'int16'.
     """
     # Get 'indices' for cream experiments. Biased towards earlier time-points.
     tm = (tf-t0) / 4.
-    offset = tm / experiments
-    indices = np.arange(t0+offset, tm+offset, offset)
+    spacing = tm / experiments
+    indices = np.arange(t0+spacing, tm+spacing, spacing)
     indices = [indices[i] for i in range(experiments)]
     indices = reversed(indices)
 
@@ -47,10 +57,16 @@ def model(t0=0, tf=30, dt=.1, T0=90, Tf=70, Tp=75, Te=-5, experiments=8):
     times['black'] = np.arange(t0,tf,dt)
     times['cream'] = times['black'][[int(i*(1/dt)) for i in indices]]
 
-    return cool(times, t0, dt, T0, Tf, Tp, Te)
+    return cool(times, t0, dt, T0, Tf, Tp, Te, goals, precision, deviation, scale, offset)
 
-def cool(times, t0, dt, T0, Tf, Tp, Te):
+def cool(times, t0, dt, T0, Tf, Tp, Te, goals=None, precision='float64', deviation=None, scale=SCALE, offset=OFFSET):
     """  Calculates a set of Temperature values given some initial conditions and calculated constants.
+         If 'goals' are given, every trajectory stops as soon as its goals are met, and only the answers are returned;
+         the answers are not stored, so 'precision' must then be left at 'float64'.
+         If 'precision' is reduced, every trajectory is stored as arrays (times as 'float32', Temps per 'precision';
+         read 'int16' with 'unpack' and the same 'scale' and 'offset'), and the worst deviation from full precision
+         is recorded in 'deviation'.
+         Temperatures are always calculated in 'float64'.
 
         :param times: A dictionary of time measurements. ('black':interval, 'cream':samples of 'black')
         :param t0: The inital time of Temperature measurement.
@@ -59,7 +75,22 @@ def cool(times, t0, dt, T0, Tf, Tp, Te):
         :param Tf: The temperature equilibrium.
         :param Tp: The preferred temperature of the object.
         :param Te: The immediate change in temperature upon experiment.
+        :param goals: An optional dictionary of the quantities needed. ('best':True for (t*,T*) of black coffee,
+                      'threshold':T, 'epsilon':e or 'at':t for the first (t,T) of every trajectory at or below T,
+                      within e of Tf, or at or after t; a false 'best' is not requested)
+        :param precision: The precision in which to store the trajectories. ('float64', 'float32' or 'int16')
+        :param deviation: An optional dictionary to fill with the worst difference between the stored and
+                          calculated 'times' and 'Temps'.
+        :param scale: The resolution of Temperatures stored as 'int16'.
+        :param offset: The Temperature stored as 0 in 'int16'.
     """
+    if precision not in PRECISIONS:
+        raise ValueError("Precision must be among "+str(list(PRECISIONS))+"; not '"+str(precision)+"'.")
+    if precision == 'int16' and not scale > 0:
+        raise ValueError("The scale of 'int16' Temperatures must be positive.")
+    if goals != None and precision != 'float64':
+        raise ValueError("Goals return single (t,T) answers; 'precision' only applies to stored trajectories.")
+
     # Defines a lambda function that calculates each new temperature.
     _cool = lambda current,final,constant,delta: (current - constant*(current - final)*delta)
 
@@ -70,7 +101,27 @@ def cool(times, t0, dt, T0, Tf, Tp, Te):
     super_times, super_Temps = [list(data_times), list(data_times)], [list(data_Temps_b), list(data_Temps_c)]
     # Define 'sub' lists to store the result of an experiment.
     sub_times, sub_Temps = [t0], [T0]
-    
+
+    if goals != None:
+        unknown = [goal for goal in goals if goal not in GOALS]
+        if unknown:
+            raise ValueError("Unknown goals "+str(unknown)+"; goals must be among "+str(list(GOALS))+".")
+        # A false 'best' asks for nothing.
+        goals = dict((goal, value) for goal, value in goals.items() if goal != 'best' or value)
+
+        # Every time the 'black' coffee could be measured.
+        every_time = [t0] + list(times['black'])
+        # The goals met by each trajectory; 'black' first.
+        found = [{}]; _seek(goals, found[0], t0, T0, Tf)
+        # Cream branches need 'black' Temps up to the latest planned experiment; unless only t* is wanted.
+        creamed = [goal for goal in goals if goal != 'best']
+        last = max([int(np.where(times['black'] == tc)[0]) for tc in times['cream']] or [-1]) if creamed else -1
+
+    # The worst difference between stored and calculated values, if 'precision' is reduced.
+    if deviation == None:
+        deviation = {}
+    deviation.update({'times': 0., 'Temps': 0.})
+
     just_right = False   # Not too hot; maybe a little cold.
     for tb in times['black']:   # For every time allotted for coffee cooling...
         # The current Temperature.
@@ -91,16 +142,41 @@ def cool(times, t0, dt, T0, Tf, Tp, Te):
 
             times['cream'] = np.concatenate(([tb], times['cream']))
 
+            # The cream branch of t* begins from the last time/Temp.
+            if goals != None: found[0]['best'] = (sub_times[-1], sub_Temps[-1])
+
         sub_times.append(tb)
         sub_Temps.append(Tn)
 
+        # Stop once 'black' has met its goals and every cream branch has somewhere to begin.
+        if goals != None and _seek(goals, found[0], tb, Tn, Tf) and len(sub_Temps) > last+1 \
+                         and ('best' not in goals or just_right):
+            break
+
     super_times.append(sub_times)
     super_Temps.append(sub_Temps)
 
+    if goals != None and not creamed:   # Only t* was wanted; skip the cream branches.
+        return _answers(goals, found)
+
     for tc in times['cream']:   # For every chosen time to add cream to the coffee...
         # Find the index of 'tc' in times['black']. 
         index = int(np.where(times['black'] == tc)[0])
 
+        if goals != None:   # Calculate only as many Temps of the creamed coffee as the goals need.
+            sub_times = every_time[index:];                sub_times[1:1] = [sub_times[0]]
+            sub_Temps = [super_Temps[2][index], super_Temps[2][index]+Te]
+            found.append({}); done = _seek(goals, found[-1], sub_times[1], sub_Temps[1], Tf)
+
+            for i in range(2,len(sub_times)):
+                if done: break
+                sub_Temps.append(_cool(sub_Temps[i-1], Tf, constants['cream'], dt))
+                done = _seek(goals, found[-1], sub_times[i], sub_Temps[i], Tf)
+
+            super_times.append(sub_times[:len(sub_Temps)])
+            super_Temps.append(sub_Temps)
+            continue
+
         # List of times starting from 'index'.         |    # Insert a duplicate time.
         sub_times = copy(super_times[2][index:]);      sub_times[1:1] = [sub_times[0]]
         # List of Temps starting from 'index'.         |    # Insert a duplicate Temp and add cream to T_i=1.
@@ -116,11 +192,101 @@ def cool(times, t0, dt, T0, Tf, Tp, Te):
 
             sub_Temps[i] = Tn
 
+        if precision != 'float64':  # Only 'black' feeds later branches; store this one now.
+            sub_times, sub_Temps = _reduce(sub_times, sub_Temps, precision, deviation, scale, offset)
+
         super_times.append(sub_times)
         super_Temps.append(sub_Temps)
 
+    if goals != None:
+        return _answers(goals, found)
+
+    if precision != 'float64':  # Store the samples and 'black' coffee, now that every branch is done.
+        for i in range(3):
+            super_times[i], super_Temps[i] = _reduce(super_times[i], super_Temps[i], precision, deviation, scale, offset)
+
     return super_times, super_Temps, constants
 
+def _reduce(sub_times, sub_Temps, precision, deviation, scale, offset):
+    """ Stores a trajectory at a reduced precision, and updates the worst deviation of 'times' and 'Temps'.
+    """
+    times, Temps = pack(sub_times, 'float32'), pack(sub_Temps, precision, scale, offset)
+
+    if len(sub_times):
+        deviation['times'] = max(deviation['times'], float(np.max(np.abs(unpack(times) - sub_times))))
+        deviation['Temps'] = max(deviation['Temps'], float(np.max(np.abs(unpack(Temps, scale, offset) - sub_Temps))))
+
+    return times, Temps
+
+def pack(values, precision='float32', scale=SCALE, offset=OFFSET):
+    """ Stores values at a reduced precision. As 'int16', a value is stored as round((value - offset)/scale).
+
+        :param values: The values to store.
+        :param precision: The precision in which to store the values. ('float64', 'float32' or 'int16')
+        :param scale: The resolution of values stored as 'int16'.
+        :param offset: The value stored as 0 in 'int16'.
+    """
+    values = np.asarray(values, dtype=np.float64)
+
+    if precision not in PRECISIONS:
+        raise ValueError("Precision must be among "+str(list(PRECISIONS))+"; not '"+str(precision)+"'.")
+    if precision != 'int16':
+        return values.astype(precision)
+
+    with np.errstate(invalid='ignore'):
+        codes = np.round((values - offset) / scale)
+        if np.any(np.abs(codes) > -EMPTY - 1):
+            raise ValueError("Values lie outside the range of 'int16' at this scale and offset.")
+
+    # 'nan' is stored as the lowest 'int16'.
+    codes[np.isnan(codes)] = EMPTY
+    return codes.astype(np.int16)
+
+def unpack(values, scale=SCALE, offset=OFFSET):
+    """ Restores values stored by 'pack' to 'float64'.
+
+        :param values: The stored values.
+        :param scale: The resolution of values stored as 'int16'.
+        :param offset: The value stored as 0 in 'int16'.
+    """
+    values = np.asarray(values)
+
+    if values.dtype != np.int16:
+        return np.asarray(values, dtype=np.float64)
+
+    restored = values*scale + offset
+    restored[values == EMPTY] = np.nan
+    return restored
+
+def _seek(goals, found, t, T, Tf):
+    """ Records the (t,T) of every goal a trajectory meets for the first time, and tells whether all are met.
+        The 'best' goal is recorded, and checked, by 'cool' itself.
+    """
+    if 'threshold' in goals and 'threshold' not in found and T <= goals['threshold']:
+        found['threshold'] = (t, T)
+    if 'epsilon' in goals and 'epsilon' not in found and abs(T - Tf) <= goals['epsilon']:
+        found['epsilon'] = (t, T)
+    if 'at' in goals and 'at' not in found and t >= goals['at']:
+        found['at'] = (t, T)
+
+    return all(goal in found for goal in goals if goal != 'best')
+
+def _answers(goals, found):
+    """ Collects the answers to 'goals' from the goals met by each trajectory.
+        'best' is a single (t*,T*); every other goal is a list of (t,T), 'black' first, then each cream
+        branch in the order cream was added. (t*'s branch only if 'black' reached it) A goal that was never met is 'None'.
+        A cream branch is checked from the moment cream is added, so when it begins at or after 'at', its
+        answer is the time cream is added and the Temp just after it; not the 'black' Temp just before.
+    """
+    answers = {}
+    for goal in goals:
+        if goal == 'best':
+            answers[goal] = found[0].get(goal)
+        else:
+            answers[goal] = [met.get(goal) for met in found]
+
+    return answers
+
 def sample_data(data=None):
     """ Calculates thermal constants from a dataset.
         
@@ -164,6 +330,13 @@ def sample_data(data=None):
 
 #~ Entry point of the script.
 if __name__ == "__main__":
+    #~ Setup
+    # Make sure the working directory is set to this script's location.
+    os.chdir(os.path.dirname(os.path.abspath(sys.argv[0])))
+    # Make sure any open plots are closed when this script ends.
+    atexit.register(lambda destruct: plt.close(), None)
+    #/~ Setup
+
     t0 = 0          # Begin modeling the Temperature at t=0 minutes.
     tf = 40         # Stop modeling the Temperature at tf=40 minutes.
     dt = .001       # Between t0 and tf, conduct a calculation for every dt.
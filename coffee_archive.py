@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: coffee_archive
+   :synopsis: Stores the scalar results of many coffee models in a chunked, indexed, columnar archive.
+
+.. moduleauthor:: Huginn
+"""
+
+#~ Modules
+from coffee import sample_data, pack, unpack, SCALE, OFFSET, EMPTY
+from itertools import product
+import  os, json, \
+        numpy as np
+#/~ Modules
+
+#~ Globals
+# The columns that receive a sorted index unless told otherwise.
+KEYS = ['t_star', 'T_star']
+# The name of the file describing the layout of an archive.
+MANIFEST = 'manifest.json'
+#/~ Globals
+
+#~ Functions
+def summarize(times, Temps, constants, t0, tf, dt, T0, Tf, Tp, Te, at=(), scale=SCALE, offset=OFFSET):
+    """ Reduces the output of 'coffee.model' to a dictionary of scalars.
+        If the preferred temperature is never reached, 't_star', 'T_star' and 'T_cream' are 'nan'.
+
+        :param times: The times returned by 'coffee.model'.
+        :param Temps: The Temperatures returned by 'coffee.model'.
+        :param constants: The thermal constants returned by 'coffee.model'.
+        :param t0: The inital time of Temperature measurement.
+        :param tf: The maximum amount of time allotted for cooling.
+        :param dt: The time differential.
+        :param T0: The initial temperature of the object.
+        :param Tf: The temperature equilibrium.
+        :param Tp: The preferred temperature of the object.
+        :param Te: The immediate change in temperature upon experiment.
+        :param at: Minutes at which to record the temperature of black coffee; stored as 'T_<minute>'.
+        :param scale: The resolution of Temperatures stored as 'int16'; as given to 'coffee.model'.
+        :param offset: The Temperature stored as 0 in 'int16'; as given to 'coffee.model'.
+    """
+    # Restore trajectories stored at a reduced precision.
+    black_times, black_Temps = unpack(times[2]), unpack(Temps[2], scale, offset)
+
+    # Index of the first 'black' Temp that, with cream, is "just right". (Mirrors 'coffee.cool')
+    t_star = T_star = T_cream = np.nan
+    if Tp != None:
+        found = np.nonzero(black_Temps[1:] + Te <= Tp)[0]
+        if len(found):
+            t_star = black_times[found[0]]
+            T_star = black_Temps[found[0]]
+            T_cream = unpack(Temps[3][-1:], scale, offset)[0]
+
+    record = {'t0': t0, 'tf': tf, 'dt': dt, 'T0': T0, 'Tf': Tf,
+              'Tp': np.nan if Tp == None else Tp, 'Te': Te,
+              'cb': constants['black'], 'cc': constants['cream'],
+              't_star': t_star, 'T_star': T_star,
+              'T_black': black_Temps[-1], 'T_cream': T_cream}
+    for minute in at:
+        record['T_'+str(minute)] = np.interp(minute, black_times, black_Temps)
+
+    return record
+
+def sweep(T0s, Tps, Tes, t0=0, tf=30, dt=.1, Tf=20, at=(), data=None):
+    """ Summarizes, as columns, the cooling of coffee for every combination of (T0, Tp, Te); as 'summarize' would.
+        The thermal constants are fitted once, and every scenario is stepped at the same time through the
+        difference equation of 'coffee.cool'. Only 'black' coffee and the cream branch of t* are calculated.
+
+        :param T0s: The initial temperatures to model.
+        :param Tps: The preferred temperatures to model.
+        :param Tes: The changes in temperature upon adding cream to model.
+        :param t0: The inital time of Temperature measurement.
+        :param tf: The maximum amount of time allotted for cooling.
+        :param dt: The time differential.
+        :param Tf: The temperature equilibrium.
+        :param at: Minutes at which to record the temperature of black coffee.
+        :param data: The dataset used to derive cooling constants. If 'None' use default 'data'.
+    """
+    constants = sample_data(data)[2]
+    cb, cc = constants['black'], constants['cream']
+
+    T0, Tp, Te = np.array(list(product(T0s, Tps, Tes)), dtype=float).reshape(-1, 3).T.copy()
+    # The times logged for 'black' coffee by 'coffee.cool'.
+    black_times = [t0] + list(np.arange(t0, tf, dt))
+
+    # Where every 'at' minute falls among the logged times, and which 'black' Temps to keep for it.
+    spots = [np.interp(minute, black_times, np.arange(len(black_times))) for minute in at]
+    wanted = set(i for spot in spots for i in (int(spot), min(int(spot)+1, len(black_times)-1)))
+    kept = {0: T0.copy()}
+
+    t_star, T_star = np.full(len(T0), np.nan), np.full(len(T0), np.nan)
+    cream, found = np.full(len(T0), np.nan), np.zeros(len(T0), dtype=bool)
+    Tc = T0.copy()
+    for i in range(1, len(black_times)):    # For every time allotted for coffee cooling...
+        # The next Temperature according to the difference equation.
+        Tn = Tc - cb*(Tc - Tf)*dt
+
+        # The cream branch of t* begins from the last time/Temp. (Mirrors 'coffee.cool')
+        just_right = ~found & (Tn + Te <= Tp)
+        t_star[just_right], T_star[just_right] = black_times[i-1], Tc[just_right]
+        cream[just_right] = Tc[just_right] + Te[just_right]
+        found |= just_right
+
+        # Cool every cream branch that has begun.
+        cream[found] = cream[found] - cc*(cream[found] - Tf)*dt
+
+        Tc = Tn
+        if i in wanted: kept[i] = Tc
+
+    columns = {'t0': np.full(len(T0), t0, dtype=float), 'tf': np.full(len(T0), tf, dtype=float),
+               'dt': np.full(len(T0), dt, dtype=float), 'Tf': np.full(len(T0), Tf, dtype=float),
+               'cb': np.full(len(T0), cb), 'cc': np.full(len(T0), cc),
+               'T0': T0, 'Tp': Tp, 'Te': Te, 't_star': t_star, 'T_star': T_star,
+               'T_black': Tc, 'T_cream': cream}
+    for minute, spot in zip(at, spots):
+        low, high = int(spot), min(int(spot)+1, len(black_times)-1)
+        columns['T_'+str(minute)] = kept[low] + (spot - low)*(kept[high] - kept[low])
+
+    return columns
+
+def write(path, columns, chunk=65536, keys=None, precision='float64'):
+    """ Writes a dictionary of equal-length columns to a directory of chunked '.npy' files.
+        Every chunk records its minimum and maximum, and every key column gets a sorted index.
+        At a reduced precision, the worst deviation of every column is recorded in the manifest.
+
+        :param path: The directory in which to store the archive.
+        :param columns: A dictionary mapping column names to 1-D arrays.
+        :param chunk: The number of rows per chunk.
+        :param keys: The columns to index. If 'None' use the default 'KEYS' that are present.
+        :param precision: The precision in which to store the columns. ('float64', 'float32' or 'int16')
+    """
+    if keys == None:
+        keys = [key for key in KEYS if key in columns]
+    columns = dict((name, np.asarray(values, dtype=float)) for name, values in columns.items())
+
+    rows = set(len(values) for values in columns.values())
+    if len(rows) > 1:
+        raise ValueError("Every column must have the same length.")
+    rows = rows.pop() if rows else 0
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    manifest = {'rows': rows, 'chunk': chunk, 'columns': sorted(columns), 'stats': {}, 'keys': list(keys),
+                'precision': precision, 'quantum': {}, 'deviation': {}}
+    stored = {}
+    for name, values in columns.items():
+        # Store the column, and keep what readers will see of it.
+        quantum = _quantum(values) if precision == 'int16' else (1., 0.)
+        stored[name] = pack(values, precision, *quantum)
+        columns[name], original = unpack(stored[name], *quantum), values
+        manifest['quantum'][name] = list(quantum)
+        manifest['deviation'][name] = _worst(columns[name], original)
+
+        stats = []
+        for n, start in enumerate(range(0, rows, chunk)):   # For every chunk of this column...
+            part = columns[name][start:start+chunk]
+            np.save(os.path.join(path, name+'.'+str(n)+'.npy'), stored[name][start:start+chunk])
+            # Record the bounds of the chunk; 'None' when the chunk has no numbers at all.
+            finite = part[~np.isnan(part)]
+            stats.append([float(finite.min()), float(finite.max())] if len(finite) else [None, None])
+        manifest['stats'][name] = stats
+
+    for key in keys:    # Sort every key column; 'nan' sorts last and is dropped.
+        order = np.argsort(columns[key], kind='mergesort')
+        order = order[~np.isnan(columns[key][order])]
+        np.save(os.path.join(path, key+'.order.npy'), order)
+        np.save(os.path.join(path, key+'.sorted.npy'), stored[key][order])
+
+    with open(os.path.join(path, MANIFEST), 'w') as handle:
+        json.dump(manifest, handle)
+
+    return manifest
+
+def _quantum(values):
+    """ The scale and offset that fit the numbers of a column into 'int16'.
+    """
+    finite = values[~np.isnan(values)]
+    if not len(finite) or finite.min() == finite.max():
+        return (1., float(finite[0]) if len(finite) else 0.)
+
+    return ((finite.max() - finite.min()) / 65532., (finite.max() + finite.min()) / 2.)
+
+def _worst(values, original):
+    """ The largest absolute difference between two columns, where both are numbers.
+    """
+    diff = np.abs(values - original)
+    diff = diff[~np.isnan(diff)]
+    return float(diff.max()) if len(diff) else 0.
+
+def manifest(path):
+    """ Reads the description of an archive.
+
+        :param path: The directory of the archive.
+    """
+    with open(os.path.join(path, MANIFEST)) as handle:
+        return json.load(handle)
+
+def load(path, name, n, layout=None, rows=None):
+    """ Lazily maps a single chunk of a column from disk; restored to 'float64' if stored at a reduced precision.
+
+        :param path: The directory of the archive.
+        :param name: The name of the column.
+        :param n: The number of the chunk.
+        :param layout: The manifest of the archive. If 'None' it is read from 'path'.
+        :param rows: The rows of the chunk to read. If 'None' read every row.
+    """
+    if layout == None:
+        layout = manifest(path)
+    values = np.load(os.path.join(path, name+'.'+str(n)+'.npy'), mmap_mode='r')
+
+    return unpack(values if rows is None else values[rows], *layout['quantum'][name])
+
+def take(path, names, rows, layout=None):
+    """ Gathers the values of some columns at the given row numbers.
+
+        :param path: The directory of the archive.
+        :param names: The names of the columns to gather.
+        :param rows: The row numbers to gather, in the order they should be returned.
+        :param layout: The manifest of the archive. If 'None' it is read from 'path'.
+    """
+    if layout == None:
+        layout = manifest(path)
+    rows = np.asarray(rows, dtype=np.intp)
+    result = dict((name, np.empty(len(rows))) for name in names)
+
+    # Visit each chunk once, no matter how the rows are ordered.
+    which = rows // layout['chunk']
+    for n in np.unique(which):
+        mask = which == n
+        for name in names:
+            result[name][mask] = load(path, name, n, layout, rows[mask] - n*layout['chunk'])
+
+    return result
+
+def _overlaps(bounds, low, high):
+    """ Whether a chunk with the given [min, max] bounds may contain values within [low, high].
+    """
+    if bounds[0] == None:
+        return False
+    return (low == None or bounds[1] >= low) and (high == None or bounds[0] <= high)
+
+def _search(ordered, low, high, scale, offset):
+    """ The slice of a stored, sorted column whose restored values lie within [low, high].
+        The bounds are brought to the stored precision, so the column is searched on disk as it is.
+    """
+    start, stop = 0, len(ordered)
+
+    if ordered.dtype == np.int16:
+        restore = lambda code: code*scale + offset
+        highest = -EMPTY - 1
+        with np.errstate(invalid='ignore'):
+            if low != None:     # The smallest code restored to at least 'low'.
+                code = int(np.ceil(np.clip((low - offset) / scale, -highest - 1, highest + 1)))
+                while -highest <= code <= highest and restore(code) < low: code += 1
+                while -highest < code <= highest + 1 and restore(code - 1) >= low: code -= 1
+                start = len(ordered) if code > highest else 0 if code < -highest else \
+                        np.searchsorted(ordered, np.int16(code), 'left')
+            if high != None:    # The largest code restored to at most 'high'.
+                code = int(np.floor(np.clip((high - offset) / scale, -highest - 1, highest + 1)))
+                while -highest <= code <= highest and restore(code) > high: code -= 1
+                while -highest - 1 <= code < highest and restore(code + 1) <= high: code += 1
+                stop = 0 if code < -highest else len(ordered) if code > highest else \
+                       np.searchsorted(ordered, np.int16(code), 'right')
+        return start, stop
+
+    with np.errstate(over='ignore'):
+        if low != None:     # Round 'low' up, so no stored value below it compares as equal.
+            low = ordered.dtype.type(low) if float(ordered.dtype.type(low)) >= low else \
+                  np.nextafter(ordered.dtype.type(low), ordered.dtype.type(np.inf))
+            start = np.searchsorted(ordered, low, 'left')
+        if high != None:    # Round 'high' down, likewise.
+            high = ordered.dtype.type(high) if float(ordered.dtype.type(high)) <= high else \
+                   np.nextafter(ordered.dtype.type(high), ordered.dtype.type(-np.inf))
+            stop = np.searchsorted(ordered, high, 'right')
+
+    return start, stop
+
+def _within(values, low, high):
+    """ A mask of the values within [low, high]; 'None' leaves a side unbounded.
+    """
+    mask = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):     # 'nan' is already left out by the mask.
+        if low != None: mask &= values >= low
+        if high != None: mask &= values <= high
+    return mask
+
+def query(path, where, names=None):
+    """ Finds every scenario whose columns fall within the given ranges.
+        Uses the narrowest sorted index among the conditions, or else skips chunks by their bounds.
+
+        :param path: The directory of the archive.
+        :param where: A dictionary mapping column names to (low, high) ranges; 'None' leaves a side unbounded.
+        :param names: The columns to return. If 'None' return every column.
+    """
+    layout = manifest(path)
+    if names == None:
+        names = layout['columns']
+    where = dict(where)
+
+    # Find the candidate rows of every indexed condition.
+    candidates = None
+    for key in [key for key in where if key in layout['keys']]:
+        low, high = where[key]
+        ordered = np.load(os.path.join(path, key+'.sorted.npy'), mmap_mode='r')
+        start, stop = _search(ordered, low, high, *layout['quantum'][key])
+        if candidates is None or stop - start < len(candidates):
+            candidates = np.load(os.path.join(path, key+'.order.npy'), mmap_mode='r')[start:stop]
+            chosen = key
+
+    if candidates is not None:  # Filter the narrowest candidates by the remaining conditions.
+        rows = np.sort(candidates)
+        del where[chosen]
+        if where:
+            values = take(path, list(where), rows, layout)
+            mask = np.ones(len(rows), dtype=bool)
+            for name, (low, high) in where.items():
+                mask &= _within(values[name], low, high)
+            rows = rows[mask]
+        return take(path, names, rows, layout)
+
+    rows = []
+    for n in range(len(range(0, layout['rows'], layout['chunk']))):  # For every chunk...
+        # Skip the chunk if any condition cannot be satisfied by its bounds.
+        if not all(_overlaps(layout['stats'][name][n], low, high) for name, (low, high) in where.items()):
+            continue
+        # Every row of the chunk, until a condition says otherwise.
+        mask = np.ones(min(layout['chunk'], layout['rows'] - n*layout['chunk']), dtype=bool)
+        for name, (low, high) in where.items():
+            mask &= _within(load(path, name, n, layout), low, high)
+        rows.append(np.nonzero(mask)[0] + n*layout['chunk'])
+
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.intp)
+    return take(path, names, rows, layout)
+
+def top(path, name, k, names=None, largest=True):
+    """ Finds the 'k' scenarios with the largest (or smallest) values of a column.
+        Uses the column's sorted index if it has one, or else visits chunks in order of their bounds
+        and stops once no remaining chunk can improve on the current 'k'.
+
+        :param path: The directory of the archive.
+        :param name: The column to rank by.
+        :param k: The number of scenarios to return.
+        :param names: The columns to return. If 'None' return every column.
+        :param largest: Rank from the largest value if 'True', else from the smallest.
+    """
+    layout = manifest(path)
+    if names == None:
+        names = layout['columns']
+
+    if k <= 0:
+        return take(path, names, [], layout)
+
+    if name in layout['keys']:
+        order = np.load(os.path.join(path, name+'.order.npy'), mmap_mode='r')
+        rows = order[::-1][:k] if largest else order[:k]
+        return take(path, names, rows, layout)
+
+    sign = -1. if largest else 1.
+    stats = [(sign*(bounds[1] if largest else bounds[0]), n)
+             for n, bounds in enumerate(layout['stats'][name]) if bounds[0] != None]
+    best_keys, best_rows = np.array([]), np.array([], dtype=np.intp)
+    for bound, n in sorted(stats):  # For every chunk, most promising first...
+        if len(best_keys) >= k and bound > best_keys[-1]:
+            break
+        values = sign*load(path, name, n, layout)
+        valid = np.nonzero(~np.isnan(values))[0]
+        best_keys = np.concatenate((best_keys, values[valid]))
+        best_rows = np.concatenate((best_rows, valid + n*layout['chunk']))
+        keep = np.argsort(best_keys, kind='mergesort')[:k]
+        best_keys, best_rows = best_keys[keep], best_rows[keep]
+
+    return take(path, names, best_rows, layout)
+
+#/~ Functions
+
+#~ Entry point of the script.
+if __name__ == "__main__":
+    columns = sweep(T0s=np.arange(80, 96, 5), Tps=np.arange(60, 81, 5), Tes=[-3, -5, -7], at=(10,))
+    write('archive', columns, chunk=16)
+
+    fast = query('archive', {'t_star': (None, 3.)}, ['T0', 'Tp', 'Te', 't_star'])
+    print "\n~ t* under 3 minutes ~"
+    for row in zip(fast['T0'], fast['Tp'], fast['Te'], fast['t_star']):
+        print "T0 = %g°C, Tp = %g°C, Te = %g°C: t* = %g minutes" % row
+
+    hot = top('archive', 'T_10', 3, ['T0', 'Tp', 'Te', 'T_10'])
+    print "\n~ Hottest at minute 10 ~"
+    for row in zip(hot['T0'], hot['Tp'], hot['Te'], hot['T_10']):
+        print "T0 = %g°C, Tp = %g°C, Te = %g°C: T(10) = %g°C" % row